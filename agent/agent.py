@@ -31,7 +31,6 @@ if 'langgraph.graph.graph' not in sys.modules:
 # Now we can safely import everything else
 from typing import Any, List, Optional, Dict
 from typing_extensions import Literal
-from langchain_groq import ChatGroq
 from langchain_core.messages import SystemMessage, BaseMessage, HumanMessage, AIMessage, ToolMessage
 from langchain_core.runnables import RunnableConfig
 from langchain.tools import tool
@@ -40,6 +39,9 @@ from langgraph.types import Command
 from copilotkit import CopilotKitState
 from langgraph.prebuilt import ToolNode
 from langgraph.types import interrupt
+import canvas_digest
+import providers
+import speculation
 
 class AgentState(CopilotKitState):
     """
@@ -60,46 +62,51 @@ class AgentState(CopilotKitState):
     planSteps: List[Dict[str, Any]] = []
     currentStepIndex: int = -1
     planStatus: str = ""
-def summarize_items_for_prompt(state: AgentState) -> str:
+def summarize_item_for_prompt(p: Dict[str, Any]) -> str:
+    pid = p.get("id", "")
+    name = p.get("name", "")
+    itype = p.get("type", "")
+    data = p.get("data", {}) or {}
+    subtitle = p.get("subtitle", "")
+    summary = ""
+    if itype == "project":
+        field1 = data.get("field1", "")
+        field2 = data.get("field2", "")
+        field3 = data.get("field3", "")
+        checklist_items = (data.get("field4", []) or [])
+        checklist = ", ".join([c.get("text", "") for c in checklist_items])
+        summary = f"subtitle={subtitle} · field1={field1} · field2={field2} · field3={field3} · field4=[{checklist}]"
+    elif itype == "entity":
+        field1 = data.get("field1", "")
+        field2 = data.get("field2", "")
+        selected_tags = (data.get("field3", []) or [])
+        available_tags = (data.get("field3_options", []) or [])
+        tags = ", ".join(selected_tags)
+        opts = ", ".join(available_tags)
+        summary = f"subtitle={subtitle} · field1={field1} · field2={field2} · field3(tags)=[{tags}] · field3_options=[{opts}]"
+    elif itype == "note":
+        content = data.get("field1", "")
+        # Include full content so the model has complete visibility for edits
+        summary = f"subtitle={subtitle} · noteContent=\"{content}\""
+    elif itype == "chart":
+        metrics_list = (data.get("field1", []) or [])
+        metrics = ", ".join([f"{m.get('label','')}:{m.get('value', 0)}%" for m in metrics_list])
+        summary = f"subtitle={subtitle} · field1(metrics)=[{metrics}]"
+    return f"id={pid} · name={name} · type={itype} · {summary}"
+
+
+def summarize_item_list(items: List[Dict[str, Any]]) -> str:
     try:
-        items = state.get("items", []) or []
-        lines: List[str] = []
-        for p in items:
-            pid = p.get("id", "")
-            name = p.get("name", "")
-            itype = p.get("type", "")
-            data = p.get("data", {}) or {}
-            subtitle = p.get("subtitle", "")
-            summary = ""
-            if itype == "project":
-                field1 = data.get("field1", "")
-                field2 = data.get("field2", "")
-                field3 = data.get("field3", "")
-                checklist_items = (data.get("field4", []) or [])
-                checklist = ", ".join([c.get("text", "") for c in checklist_items])
-                summary = f"subtitle={subtitle} · field1={field1} · field2={field2} · field3={field3} · field4=[{checklist}]"
-            elif itype == "entity":
-                field1 = data.get("field1", "")
-                field2 = data.get("field2", "")
-                selected_tags = (data.get("field3", []) or [])
-                available_tags = (data.get("field3_options", []) or [])
-                tags = ", ".join(selected_tags)
-                opts = ", ".join(available_tags)
-                summary = f"subtitle={subtitle} · field1={field1} · field2={field2} · field3(tags)=[{tags}] · field3_options=[{opts}]"
-            elif itype == "note":
-                content = data.get("field1", "")
-                # Include full content so the model has complete visibility for edits
-                summary = f"subtitle={subtitle} · noteContent=\"{content}\""
-            elif itype == "chart":
-                metrics_list = (data.get("field1", []) or [])
-                metrics = ", ".join([f"{m.get('label','')}:{m.get('value', 0)}%" for m in metrics_list])
-                summary = f"subtitle={subtitle} · field1(metrics)=[{metrics}]"
-            lines.append(f"id={pid} · name={name} · type={itype} · {summary}")
+        lines = [summarize_item_for_prompt(p) for p in (items or [])]
         return "\n".join(lines) if lines else "(no items)"
     except Exception:
         return "(unable to summarize items)"
 
 
+def summarize_items_for_prompt(state: AgentState) -> str:
+    return summarize_item_list(state.get("items", []) or [])
+
+
 @tool
 def set_plan(steps: List[str]):
     """
@@ -239,79 +246,30 @@ FRONTEND_TOOL_ALLOWLIST = set([
 ])
 
 
-async def chat_node(state: AgentState, config: RunnableConfig) -> Command[Literal["tool_node", "__end__"]]:
-    print(f"state: {state}")
+def build_prompt_messages(state: AgentState, baseline: Optional[canvas_digest.Baseline] = None, fresh: bool = True) -> List[BaseMessage]:
     """
-    Standard chat node based on the ReAct design pattern. It handles:
-    - The model to use (and binds in CopilotKit actions and the tools defined above)
-    - The system prompt
-    - Getting a response from the model
-    - Handling tool calls
+    Build the full prompt for chat_node: the system message, the trimmed chat
+    history and the trailing LATEST GROUND TRUTH snapshot.
 
-    For more about the ReAct design pattern, see:
-    https://www.perplexity.ai/search/react-agents-NcXLQhreS0WDzpVaS4m9Cg
+    With a `baseline` (see canvas_digest) that was not just (re)created, the
+    system message carries only an id/name/type index of the items and the
+    ground truth only the changes since the baseline, instead of restating
+    every item twice.
     """
-
-    # 1. Define the model
-    model = ChatGroq(model="llama-3.3-70b-versatile", temperature=0.7)
-
-    # 2. Prepare and bind tools to the model (dedupe, allowlist, and cap)
-    def _extract_tool_name(tool: Any) -> Optional[str]:
-        """Extract a tool name from either a LangChain tool or an OpenAI function spec dict."""
+    if baseline is not None and not fresh:
+        items = state.get("items", []) or []
         try:
-            # OpenAI tool spec dict: { "type": "function", "function": { "name": "..." } }
-            if isinstance(tool, dict):
-                fn = tool.get("function", {}) if isinstance(tool.get("function", {}), dict) else {}
-                name = fn.get("name") or tool.get("name")
-                if isinstance(name, str) and name.strip():
-                    return name
-                return None
-            # LangChain tool object or @tool-decorated function
-            name = getattr(tool, "name", None)
-            if isinstance(name, str) and name.strip():
-                return name
-            return None
+            changes_digest = canvas_digest.format_digest(canvas_digest.diff_items(baseline, items), items, summarize_item_for_prompt)
+            items_summary = canvas_digest.format_index(items)
         except Exception:
-            return None
-
-    # Frontend tools may arrive either under state["tools"] or within the CopilotKit envelope
-    raw_tools = (state.get("tools", []) or [])
-    try:
-        ck = state.get("copilotkit", {}) or {}
-        raw_actions = ck.get("actions", []) or []
-        if isinstance(raw_actions, list) and raw_actions:
-            raw_tools = [*raw_tools, *raw_actions]
-    except Exception:
-        pass
-
-    deduped_frontend_tools: List[Any] = []
-    seen: set[str] = set()
-    for t in raw_tools:
-        name = _extract_tool_name(t)
-        if not name:
-            continue
-        if name not in FRONTEND_TOOL_ALLOWLIST:
-            continue
-        if name in seen:
-            continue
-        seen.add(name)
-        deduped_frontend_tools.append(t)
-
-    # cap to well under 128 (OpenAI tools limit), leaving room for backend tools
-    MAX_FRONTEND_TOOLS = 110
-    if len(deduped_frontend_tools) > MAX_FRONTEND_TOOLS:
-        deduped_frontend_tools = deduped_frontend_tools[:MAX_FRONTEND_TOOLS]
-
-    model_with_tools = model.bind_tools(
-        [
-            *deduped_frontend_tools,
-            *backend_tools,
-        ],
-        parallel_tool_calls=False,
-    )
-
-    # 3. Define the system message by which the chat model will be run
-    items_summary = summarize_items_for_prompt(state)
+            changes_digest = "(unable to summarize changes)"
+            items_summary = summarize_item_list(items)
+        items_label = "itemsState (index; field values changed during this plan are listed under LATEST GROUND TRUTH)"
+        latest_items = f"- item changes since the last full items listing (+ added, ~ updated, - deleted):\n{changes_digest}\n"
+    else:
+        items_summary = summarize_items_for_prompt(state)
+        items_label = "itemsState (ground truth)"
+        latest_items = f"- items:\n{items_summary}\n"
     global_title = state.get("globalTitle", "")
     global_description = state.get("globalDescription", "")
     post_tool_guidance = state.get("__last_tool_guidance", None)
@@ -354,7 +312,7 @@ async def chat_node(state: AgentState, config: RunnableConfig) -> Command[Litera
         content=(
             f"globalTitle (ground truth): {global_title}\n"
             f"globalDescription (ground truth): {global_description}\n"
-            f"itemsState (ground truth):\n{items_summary}\n"
+            f"{items_label}:\n{items_summary}\n"
             f"lastAction (ground truth): {last_action}\n"
             f"planStatus (ground truth): {plan_status}\n"
             f"currentStepIndex (ground truth): {current_step_index}\n"
@@ -417,6 +375,148 @@ async def chat_node(state: AgentState, config: RunnableConfig) -> Command[Litera
         )
     )
 
+    # Trim long histories to reduce stale context influence and suppress typing flicker
+    trimmed_messages = (state.get("messages", []) or [])[-12:]
+
+    # Append a final, authoritative state snapshot after chat history
+    #
+    # Ensure the latest shared state takes priority over chat history and
+    # stale tool results. This enforces state-first grounding, reduces drift, and makes
+    # precedence explicit. Optional post-tool guidance confirms successful actions
+    # (e.g., deletion) instead of re-stating absence.
+    latest_state_system = SystemMessage(
+        content=(
+            "LATEST GROUND TRUTH (authoritative):\n"
+            f"- globalTitle: {global_title!s}\n"
+            f"- globalDescription: {global_description!s}\n"
+            f"{latest_items}"
+            f"- lastAction: {last_action}\n\n"
+            f"- planStatus: {plan_status}\n"
+            f"- currentStepIndex: {current_step_index}\n"
+            f"- planSteps: {[s.get('title', s) for s in plan_steps]}\n\n"
+            "Resolution policy: If ANY prior message mentions values that conflict with the above,\n"
+            "those earlier mentions are obsolete and MUST be ignored.\n"
+            "When asked 'what is it now', ALWAYS read from this LATEST GROUND TRUTH.\n"
+            + ("\nIf the last tool result indicated success (e.g., 'deleted:ID'), confirm the action rather than re-stating absence." if post_tool_guidance else "")
+        )
+    )
+
+    return [
+        system_message,
+        *trimmed_messages,
+        latest_state_system,
+    ]
+
+
+# Keys LangGraph keeps between runs; anything else in a node update is dropped
+STATE_KEYS = frozenset(AgentState.__annotations__)
+
+
+def predict_next_run_state(state: AgentState, update: Dict[str, Any], response: BaseMessage) -> Optional[Dict[str, Any]]:
+    """
+    Predict the state the next run starts from once the client has applied the
+    frontend tool calls in `response`, or None if their effects are unknown.
+    Only declared state keys are carried over, and tool results are left as
+    placeholders (their contents are not part of the speculation fingerprint).
+    """
+    carried = {k: v for k, v in {**state, **update}.items() if k in STATE_KEYS}
+    predicted_canvas = speculation.predict_frontend_effects(carried, response)
+    if predicted_canvas is None:
+        return None
+    return {
+        **carried,
+        **predicted_canvas,
+        "messages": [*(state.get("messages", []) or []), response, *speculation.placeholder_tool_results(response)],
+    }
+
+
+async def chat_node(state: AgentState, config: RunnableConfig) -> Command[Literal["tool_node", "__end__"]]:
+    print(f"state: {state}")
+    """
+    Standard chat node based on the ReAct design pattern. It handles:
+    - The model to use (and binds in CopilotKit actions and the tools defined above)
+    - The system prompt
+    - Getting a response from the model
+    - Handling tool calls
+
+    For more about the ReAct design pattern, see:
+    https://www.perplexity.ai/search/react-agents-NcXLQhreS0WDzpVaS4m9Cg
+    """
+
+    # 1. Define the model (provider fallbacks/hedging are configured via AGENT_MODEL_* env vars)
+    model = providers.get_router()
+
+    # 2. Prepare and bind tools to the model (dedupe, allowlist, and cap)
+    def _extract_tool_name(tool: Any) -> Optional[str]:
+        """Extract a tool name from either a LangChain tool or an OpenAI function spec dict."""
+        try:
+            # OpenAI tool spec dict: { "type": "function", "function": { "name": "..." } }
+            if isinstance(tool, dict):
+                fn = tool.get("function", {}) if isinstance(tool.get("function", {}), dict) else {}
+                name = fn.get("name") or tool.get("name")
+                if isinstance(name, str) and name.strip():
+                    return name
+                return None
+            # LangChain tool object or @tool-decorated function
+            name = getattr(tool, "name", None)
+            if isinstance(name, str) and name.strip():
+                return name
+            return None
+        except Exception:
+            return None
+
+    # Frontend tools may arrive either under state["tools"] or within the CopilotKit envelope
+    raw_tools = (state.get("tools", []) or [])
+    try:
+        ck = state.get("copilotkit", {}) or {}
+        raw_actions = ck.get("actions", []) or []
+        if isinstance(raw_actions, list) and raw_actions:
+            raw_tools = [*raw_tools, *raw_actions]
+    except Exception:
+        pass
+
+    deduped_frontend_tools: List[Any] = []
+    seen: set[str] = set()
+    for t in raw_tools:
+        name = _extract_tool_name(t)
+        if not name:
+            continue
+        if name not in FRONTEND_TOOL_ALLOWLIST:
+            continue
+        if name in seen:
+            continue
+        seen.add(name)
+        deduped_frontend_tools.append(t)
+
+    # cap to well under 128 (OpenAI tools limit), leaving room for backend tools
+    MAX_FRONTEND_TOOLS = 110
+    if len(deduped_frontend_tools) > MAX_FRONTEND_TOOLS:
+        deduped_frontend_tools = deduped_frontend_tools[:MAX_FRONTEND_TOOLS]
+
+    model_with_tools = model.bind_tools(
+        [
+            *deduped_frontend_tools,
+            *backend_tools,
+        ],
+        parallel_tool_calls=False,
+    )
+
+    # 3. Read plan state (the prompt itself is assembled by build_prompt_messages)
+    plan_steps = state.get("planSteps", []) or []
+    current_step_index = state.get("currentStepIndex", -1)
+    plan_status = state.get("planStatus", "")
+    thread_id = ((config or {}).get("configurable", {}) or {}).get("thread_id")
+
+    # While a plan is running, prompt with a per-thread board snapshot plus a change digest
+    baseline, fresh = None, True
+    try:
+        if thread_id and plan_status == "in_progress":
+            baseline, fresh = canvas_digest.baseline_for(str(thread_id), state.get("items", []) or [])
+        elif thread_id:
+            canvas_digest.forget(str(thread_id))
+    except Exception:
+        baseline, fresh = None, True
+
     # 4. Run the model to generate a response
     # If the user asked to modify an item but did not specify which, interrupt to choose
     try:
@@ -461,37 +561,13 @@ async def chat_node(state: AgentState, config: RunnableConfig) -> Command[Litera
     except Exception:
         pass
 
-    # 4.2 Trim long histories to reduce stale context influence and suppress typing flicker
-    trimmed_messages = full_messages[-12:]
-
-    # 4.3 Append a final, authoritative state snapshot after chat history
-    #
-    # Ensure the latest shared state takes priority over chat history and
-    # stale tool results. This enforces state-first grounding, reduces drift, and makes
-    # precedence explicit. Optional post-tool guidance confirms successful actions
-    # (e.g., deletion) instead of re-stating absence.
-    latest_state_system = SystemMessage(
-        content=(
-            "LATEST GROUND TRUTH (authoritative):\n"
-            f"- globalTitle: {global_title!s}\n"
-            f"- globalDescription: {global_description!s}\n"
-            f"- items:\n{items_summary}\n"
-            f"- lastAction: {last_action}\n\n"
-            f"- planStatus: {plan_status}\n"
-            f"- currentStepIndex: {current_step_index}\n"
-            f"- planSteps: {[s.get('title', s) for s in plan_steps]}\n\n"
-            "Resolution policy: If ANY prior message mentions values that conflict with the above,\n"
-            "those earlier mentions are obsolete and MUST be ignored.\n"
-            "When asked 'what is it now', ALWAYS read from this LATEST GROUND TRUTH.\n"
-            + ("\nIf the last tool result indicated success (e.g., 'deleted:ID'), confirm the action rather than re-stating absence." if post_tool_guidance else "")
-        )
-    )
-
-    response = await model_with_tools.ainvoke([
-        system_message,
-        *trimmed_messages,
-        latest_state_system,
-    ], config)
+    # 4.2 Commit a speculative response prefetched for exactly this prompt, if any
+    prompt_messages = build_prompt_messages(state, baseline, fresh)
+    response = None
+    if speculation.SPECULATIVE_PREFETCH and thread_id:
+        response = await speculation.take(str(thread_id), prompt_messages, config)
+    if response is None:
+        response = await model_with_tools.ainvoke(prompt_messages, config)
 
     # Predictive plan state updates based on imminent tool calls (for UI rendering)
     try:
@@ -626,24 +702,33 @@ async def chat_node(state: AgentState, config: RunnableConfig) -> Command[Litera
     # If the model produced FRONTEND tool calls, deliver them to the client and stop the turn.
     # The client will execute and post ToolMessage(s), after which the next run can resume.
     if has_frontend_tool_calls:
-        return Command(
-            goto=END,
-            update={
-                "messages": [response],
-                "items": state.get("items", []),
-                "globalTitle": state.get("globalTitle", ""),
-                "globalDescription": state.get("globalDescription", ""),
-                "itemsCreated": state.get("itemsCreated", 0),
-                "lastAction": state.get("lastAction", ""),
-                "planSteps": state.get("planSteps", []),
-                "currentStepIndex": state.get("currentStepIndex", -1),
-                "planStatus": state.get("planStatus", ""),
-                **plan_updates,
-                "__last_tool_guidance": (
-                    "Frontend tool calls issued. Waiting for client tool results before continuing."
-                ),
-            },
-        )
+        update = {
+            "messages": [response],
+            "items": state.get("items", []),
+            "globalTitle": state.get("globalTitle", ""),
+            "globalDescription": state.get("globalDescription", ""),
+            "itemsCreated": state.get("itemsCreated", 0),
+            "lastAction": state.get("lastAction", ""),
+            "planSteps": state.get("planSteps", []),
+            "currentStepIndex": state.get("currentStepIndex", -1),
+            "planStatus": state.get("planStatus", ""),
+            **plan_updates,
+            "__last_tool_guidance": (
+                "Frontend tool calls issued. Waiting for client tool results before continuing."
+            ),
+        }
+        # While the client applies the tools, optionally start the next plan step's
+        # model call against the predicted state; the next run commits it on a match.
+        if speculation.SPECULATIVE_PREFETCH and thread_id and has_remaining and effective_plan_status == "in_progress":
+            try:
+                predicted_state = predict_next_run_state(state, update, response)
+                if predicted_state is not None:
+                    # The next run digests against this hop's baseline unless the predicted board forces a rebase
+                    next_baseline, next_fresh = canvas_digest.preview_baseline(str(thread_id), predicted_state.get("items", []) or [])
+                    speculation.start(str(thread_id), model_with_tools, build_prompt_messages(predicted_state, next_baseline, next_fresh), config)
+            except Exception as e:
+                print(f"speculation not started: {e!r}")
+        return Command(goto=END, update=update)
 
     if has_remaining and effective_plan_status != "completed":
         # Auto-continue; include response only if it carries frontend tool calls
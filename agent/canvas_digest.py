@@ -0,0 +1,157 @@
+"""
+Per-thread canvas snapshots for compact prompts during plans.
+
+On every auto-continue hop chat_node used to restate the full items summary
+twice, although a plan step usually touches one or two cards. While a plan is
+in progress we instead keep, per thread, a baseline snapshot of the board as
+last shown in full. The full summary is only sent on the hop that creates or
+rebases the baseline. On the other hops the prompt carries a one-line index
+per item (id, name, type) so later steps can still target any card, and the
+trailing ground truth lists what changed since the baseline: added items in
+full, updated items with their changed fields, and deleted ids. Once the change
+set grows past a fraction of the board the baseline is rebased onto the current
+items and the full summary is sent again.
+"""
+
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Tuple
+
+# Rebase once more than this fraction of the board, and at least REBASE_MIN_CHANGES items, changed
+REBASE_FRACTION = 0.25
+REBASE_MIN_CHANGES = 3
+# Baselines of threads not seen for this long are dropped, as are the least recently used beyond MAX_BASELINES
+BASELINE_TTL_SECONDS = float(os.getenv("AGENT_DIGEST_TTL") or 1800)
+MAX_BASELINES = 256
+# Top-level item keys compared in addition to every data.* key
+ITEM_KEYS = ("type", "name", "subtitle", "customColor", "customIcon")
+
+
+@dataclass
+class Baseline:
+    items: Dict[str, Dict[str, Any]]
+    order: List[str] = field(default_factory=list)
+    touched: float = 0.0
+
+
+@dataclass
+class ChangeSet:
+    added: List[str] = field(default_factory=list)
+    updated: Dict[str, List[Tuple[str, Any]]] = field(default_factory=dict)
+    deleted: List[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.updated) + len(self.deleted)
+
+
+_baselines: Dict[str, Baseline] = {}
+
+
+def _index(items: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    return {str(it.get("id", "")): it for it in items}
+
+
+def _changed_fields(before: Dict[str, Any], after: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    changes: List[Tuple[str, Any]] = []
+    for key in ITEM_KEYS:
+        if before.get(key) != after.get(key):
+            changes.append((key, after.get(key)))
+    before_data = before.get("data", {}) or {}
+    after_data = after.get("data", {}) or {}
+    for key in sorted(set(before_data) | set(after_data)):
+        if before_data.get(key) != after_data.get(key):
+            changes.append((f"data.{key}", after_data.get(key)))
+    return changes
+
+
+def diff_items(baseline: Baseline, items: List[Dict[str, Any]]) -> ChangeSet:
+    """
+    Compare the current items against a baseline snapshot.
+    """
+    current = _index(items)
+    changes = ChangeSet()
+    for item_id, item in current.items():
+        before = baseline.items.get(item_id)
+        if before is None:
+            changes.added.append(item_id)
+            continue
+        fields = _changed_fields(before, item)
+        if fields:
+            changes.updated[item_id] = fields
+    changes.deleted = [item_id for item_id in baseline.order if item_id not in current]
+    return changes
+
+
+def _needs_rebase(changes: ChangeSet, board_size: int) -> bool:
+    return len(changes) >= REBASE_MIN_CHANGES and len(changes) > REBASE_FRACTION * board_size
+
+
+def _evict(now: float) -> None:
+    for tid in [t for t, b in _baselines.items() if now - b.touched > BASELINE_TTL_SECONDS]:
+        del _baselines[tid]
+    if len(_baselines) > MAX_BASELINES:
+        by_age = sorted(_baselines, key=lambda t: _baselines[t].touched)
+        for tid in by_age[: len(_baselines) - MAX_BASELINES]:
+            del _baselines[tid]
+
+
+def preview_baseline(thread_id: str, items: List[Dict[str, Any]]) -> Tuple[Baseline, bool]:
+    """
+    Return the baseline `baseline_for` would use for `items`, and whether it
+    would be newly created or rebased, without storing anything.
+    """
+    baseline = _baselines.get(thread_id)
+    if baseline is not None and not _needs_rebase(diff_items(baseline, items), len(items)):
+        return baseline, False
+    # Deep copy via JSON so later in-place edits to the state cannot leak into the snapshot
+    snapshot = json.loads(json.dumps(items, default=str))
+    return Baseline(items=_index(snapshot), order=[str(it.get("id", "")) for it in snapshot]), True
+
+
+def baseline_for(thread_id: str, items: List[Dict[str, Any]]) -> Tuple[Baseline, bool]:
+    """
+    Return the thread's baseline, creating it or rebasing it onto `items` when
+    the change set has grown too large to be worth sending as a digest. The
+    flag is True when the baseline was (re)created, i.e. on hops that must
+    send the full summary.
+    """
+    now = time.perf_counter()
+    baseline, fresh = preview_baseline(thread_id, items)
+    if fresh:
+        _baselines[thread_id] = baseline
+    baseline.touched = now
+    # The current thread was just touched, so eviction never drops it
+    _evict(now)
+    return baseline, fresh
+
+
+def forget(thread_id: str) -> None:
+    _baselines.pop(thread_id, None)
+
+
+def format_index(items: List[Dict[str, Any]]) -> str:
+    """
+    One `id · name · type` line per item, without field contents.
+    """
+    lines = [f"id={it.get('id', '')} · name={it.get('name', '')} · type={it.get('type', '')}" for it in items]
+    return "\n".join(lines) if lines else "(no items)"
+
+
+def format_digest(changes: ChangeSet, items: List[Dict[str, Any]], summarize_item: Callable[[Dict[str, Any]], str]) -> str:
+    """
+    Render a change set as prompt lines: `+` added, `~` updated, `-` deleted.
+    """
+    if not changes:
+        return "(no changes)"
+    current = _index(items)
+    lines: List[str] = []
+    for item_id in changes.added:
+        lines.append(f"+ {summarize_item(current[item_id])}")
+    for item_id, fields in changes.updated.items():
+        rendered = " · ".join(f"{name}={json.dumps(value, ensure_ascii=False, default=str)}" for name, value in fields)
+        lines.append(f"~ id={item_id} · {rendered}")
+    for item_id in changes.deleted:
+        lines.append(f"- id={item_id} (deleted)")
+    return "\n".join(lines)
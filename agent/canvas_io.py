@@ -0,0 +1,293 @@
+"""
+Bulk import/export of canvas items as JSONL.
+
+Each line is one item ({id, type, name, subtitle, data, ...}) following the
+FIELD SCHEMA that chat_node hands to the model. Imports are validated in
+chunks and applied to a thread as one state update; exports are produced by a
+generator so large boards are written out chunk by chunk.
+
+Usage:
+    python canvas_io.py import board.jsonl --thread <THREAD_ID>
+    python canvas_io.py export board.jsonl --thread <THREAD_ID>
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+ITEM_TYPES = ("project", "entity", "note", "chart", "swot")
+SELECT_OPTIONS = ("", "Option A", "Option B", "Option C")
+SWOT_KEYS = ("strengths", "weaknesses", "opportunities", "threats")
+DEFAULT_CHUNK_SIZE = 200
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def default_data_for(itype: str) -> Dict[str, Any]:
+    """
+    Mirror of defaultDataFor in src/lib/canvas/state.ts.
+    """
+    if itype == "project":
+        return {"field1": "", "field2": "", "field3": "", "field4": [], "field4_id": 0}
+    if itype == "entity":
+        return {"field1": "", "field2": "", "field3": [], "field3_options": ["Tag 1", "Tag 2", "Tag 3"]}
+    if itype == "chart":
+        return {"field1": [], "field1_id": 0}
+    if itype == "swot":
+        return {key: [] for key in SWOT_KEYS}
+    return {"field1": ""}
+
+
+def _require(cond: bool, message: str) -> None:
+    if not cond:
+        raise ValueError(message)
+
+
+def _is_str_list(value: Any) -> bool:
+    return isinstance(value, list) and all(isinstance(v, str) for v in value)
+
+
+def validate_item(raw: Any) -> Dict[str, Any]:
+    """
+    Validate a single item against the FIELD SCHEMA and return a normalized copy.
+    Missing data fields are filled from the card type's defaults.
+    Raises ValueError describing the first violation found.
+    """
+    _require(isinstance(raw, dict), "item must be a JSON object")
+    itype = raw.get("type")
+    _require(itype in ITEM_TYPES, f"type must be one of {list(ITEM_TYPES)}, got {itype!r}")
+    item_id = raw.get("id", "")
+    _require(isinstance(item_id, str), "id must be a string")
+    for key in ("name", "subtitle"):
+        _require(isinstance(raw.get(key, ""), str), f"{key} must be a string")
+    data_in = raw.get("data", {}) or {}
+    _require(isinstance(data_in, dict), "data must be an object")
+    data = {**default_data_for(itype), **data_in}
+
+    if itype == "project":
+        _require(isinstance(data["field1"], str), "project.field1 must be a string")
+        _require(data["field2"] in SELECT_OPTIONS, f"project.field2 must be one of {list(SELECT_OPTIONS)}")
+        _require(
+            isinstance(data["field3"], str) and (data["field3"] == "" or bool(_DATE_RE.match(data["field3"]))),
+            "project.field3 must be a 'YYYY-MM-DD' date or ''",
+        )
+        _require(isinstance(data["field4"], list), "project.field4 must be a list")
+        for c in data["field4"]:
+            _require(
+                isinstance(c, dict)
+                and isinstance(c.get("id"), str)
+                and isinstance(c.get("text"), str)
+                and isinstance(c.get("done"), bool)
+                and isinstance(c.get("proposed"), bool),
+                "project.field4 entries must be {id: string, text: string, done: boolean, proposed: boolean}",
+            )
+        _require(isinstance(data["field4_id"], int) and not isinstance(data["field4_id"], bool), "project.field4_id must be an integer")
+    elif itype == "entity":
+        _require(isinstance(data["field1"], str), "entity.field1 must be a string")
+        _require(data["field2"] in SELECT_OPTIONS, f"entity.field2 must be one of {list(SELECT_OPTIONS)}")
+        _require(_is_str_list(data["field3"]), "entity.field3 must be a list of strings")
+        _require(_is_str_list(data["field3_options"]), "entity.field3_options must be a list of strings")
+        missing = [t for t in data["field3"] if t not in data["field3_options"]]
+        _require(not missing, f"entity.field3 tags {missing} are not in field3_options")
+    elif itype == "note":
+        _require(isinstance(data["field1"], str), "note.field1 must be a string")
+    elif itype == "chart":
+        _require(isinstance(data["field1"], list), "chart.field1 must be a list")
+        for m in data["field1"]:
+            _require(
+                isinstance(m, dict) and isinstance(m.get("id"), str) and isinstance(m.get("label"), str),
+                "chart.field1 entries must be {id: string, label: string, value: number | ''}",
+            )
+            value = m.get("value")
+            _require(
+                value == "" or (isinstance(value, (int, float)) and not isinstance(value, bool) and 0 <= value <= 100),
+                "chart.field1 value must be in [0..100] or ''",
+            )
+        _require(isinstance(data["field1_id"], int) and not isinstance(data["field1_id"], bool), "chart.field1_id must be an integer")
+    elif itype == "swot":
+        for key in SWOT_KEYS:
+            _require(_is_str_list(data[key]), f"swot.{key} must be a list of strings")
+
+    item = {**raw, "id": item_id, "name": raw.get("name", ""), "subtitle": raw.get("subtitle", ""), "data": data}
+    return item
+
+
+def iter_item_chunks(lines: Iterable[str], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[Tuple[int, Dict[str, Any]]]]:
+    """
+    Parse and validate JSONL lines, yielding lists of at most `chunk_size`
+    (line number, item) pairs. Blank lines are skipped. Errors are reported
+    with their 1-based line number.
+    """
+    chunk: List[Tuple[int, Dict[str, Any]]] = []
+    for lineno, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            chunk.append((lineno, validate_item(json.loads(line))))
+        except (ValueError, json.JSONDecodeError) as e:
+            raise ValueError(f"line {lineno}: {e}") from e
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _numeric_id(item_id: Any) -> int:
+    try:
+        return int(str(item_id))
+    except ValueError:
+        return 0
+
+
+class ItemMerger:
+    """
+    Upserts validated chunks into a copy of a board's items.
+
+    Items with a matching id replace the existing card in place; the rest are
+    appended. Items without an id are numbered the same way the canvas does
+    (largest numeric id plus one, zero-padded). Every id placed by this import,
+    explicit or numbered, is remembered with its line number, so a second item
+    with the same id raises ValueError instead of silently replacing the first.
+    """
+
+    def __init__(self, items: Iterable[Dict[str, Any]]) -> None:
+        self.items: List[Dict[str, Any]] = list(items)
+        self._index = {it.get("id"): i for i, it in enumerate(self.items)}
+        self._counter = max([0, *(_numeric_id(it.get("id")) for it in self.items)])
+        self._seen: Dict[str, int] = {}
+
+    def add(self, chunk: List[Tuple[int, Dict[str, Any]]]) -> None:
+        for lineno, item in chunk:
+            if not item["id"]:
+                self._counter += 1
+                item = {**item, "id": str(self._counter).zfill(4)}
+            elif item["id"] in self._seen:
+                raise ValueError(f"line {lineno}: id {item['id']!r} was already used on line {self._seen[item['id']]} of this import")
+            else:
+                self._counter = max(self._counter, _numeric_id(item["id"]))
+            self._seen[item["id"]] = lineno
+            if item["id"] in self._index:
+                self.items[self._index[item["id"]]] = item
+            else:
+                self._index[item["id"]] = len(self.items)
+                self.items.append(item)
+
+
+def export_items(items: Iterable[Dict[str, Any]], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Yield the items as JSONL text, `chunk_size` lines at a time.
+    """
+    buf: List[str] = []
+    for item in items:
+        buf.append(json.dumps(item, ensure_ascii=False))
+        if len(buf) >= chunk_size:
+            yield "\n".join(buf) + "\n"
+            buf = []
+    if buf:
+        yield "\n".join(buf) + "\n"
+
+
+class Throughput:
+    """
+    Running item/byte counters for an import or export.
+    """
+
+    def __init__(self) -> None:
+        self.items = 0
+        self.bytes = 0
+        self.chunks = 0
+        self.sent = 0
+        self.started = time.perf_counter()
+
+    def add(self, items: int, nbytes: int) -> None:
+        self.items += items
+        self.bytes += nbytes
+        self.chunks += 1
+
+    def report(self) -> str:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        text = (
+            f"{self.items} items in {self.chunks} chunks, {self.bytes / 1024:.1f} KiB, "
+            f"{elapsed:.2f}s ({self.items / elapsed:.0f} items/s, {self.bytes / 1024 / elapsed:.1f} KiB/s)"
+        )
+        if self.sent:
+            text += f", {self.sent / 1024:.1f} KiB sent"
+        return text
+
+
+async def import_jsonl(client: Any, thread_id: str, stream: IO[str], chunk_size: int = DEFAULT_CHUNK_SIZE, dry_run: bool = False) -> Throughput:
+    """
+    Validate `stream` chunk by chunk, then apply the merged board to the thread
+    in a single state update (one checkpoint, however large the file).
+    """
+    stats = Throughput()
+    current: Dict[str, Any] = {}
+    if not dry_run:
+        current = await client.threads.get_state(thread_id)
+    merger = ItemMerger((current.get("values", {}) or {}).get("items", []) or [])
+    for chunk in iter_item_chunks(stream, chunk_size):
+        merger.add(chunk)
+        stats.add(len(chunk), sum(len(json.dumps(it)) for _, it in chunk))
+        print(f"validated chunk {stats.chunks}: {stats.report()}", file=sys.stderr)
+    if not dry_run and stats.items:
+        update = {"items": merger.items}
+        stats.sent = len(json.dumps(update, ensure_ascii=False).encode("utf-8"))
+        await client.threads.update_state(thread_id, update, as_node="chat_node")
+    return stats
+
+
+async def export_jsonl(client: Any, thread_id: str, out: IO[str], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Throughput:
+    """
+    Write the thread's items to `out` as JSONL.
+    """
+    stats = Throughput()
+    current = await client.threads.get_state(thread_id)
+    items = (current.get("values", {}) or {}).get("items", []) or []
+    for text in export_items(items, chunk_size):
+        out.write(text)
+        stats.add(text.count("\n"), len(text.encode("utf-8")))
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import/export canvas items as JSONL.")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path", help="JSONL file to read from or write to ('-' for stdin/stdout)")
+    parser.add_argument("--thread", help="thread id to import into or export from")
+    parser.add_argument("--url", default=os.getenv("LANGGRAPH_DEPLOYMENT_URL") or "http://localhost:8123")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="validate the import file without applying it")
+    args = parser.parse_args(argv)
+
+    if not args.thread and not (args.command == "import" and args.dry_run):
+        parser.error("--thread is required")
+
+    client = None
+    if args.thread and not args.dry_run:
+        from langgraph_sdk import get_client
+        client = get_client(url=args.url)
+
+    try:
+        if args.command == "import":
+            stream = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+            with stream:
+                stats = asyncio.run(import_jsonl(client, args.thread, stream, args.chunk_size, args.dry_run))
+        else:
+            out = sys.stdout if args.path == "-" else open(args.path, "w", encoding="utf-8")
+            with out:
+                stats = asyncio.run(export_jsonl(client, args.thread, out, args.chunk_size))
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+    print(f"{args.command} done: {stats.report()}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""
+Model provider routing with fallbacks and hedged requests.
+
+Providers are configured with AGENT_MODEL_PROVIDERS, a comma-separated list in
+priority order. Each entry is `kind:model` or `kind:model@base_url`, where kind
+is `groq` or `openai` (any OpenAI-compatible server, e.g. a local stand-in):
+
+    AGENT_MODEL_PROVIDERS=groq:llama-3.3-70b-versatile,openai:gpt-4o-mini
+    AGENT_MODEL_PROVIDERS=openai:stub@http://localhost:9001/v1,openai:stub@http://localhost:9002/v1
+
+Without hedging, a failing provider falls through to the next one. With
+AGENT_MODEL_HEDGE=1, if the active provider has not answered within its rolling
+p95 latency the next provider is fired as well and the first successful answer
+wins; the others are cancelled and their output is never returned, so tool calls
+are committed once. Whenever more than one provider is configured, attempts keep
+the run's tags, metadata and run name but not its callbacks, so an attempt that
+streams partial tool calls and then fails or loses never reaches the run; the
+winning response is then replayed once through the full run config (see
+replay_response), which gives tracing and CopilotKit a single set of model
+events for it. Token-by-token streaming is only kept with a single provider.
+"""
+
+import asyncio
+import contextvars
+import math
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import BaseMessage
+
+DEFAULT_PROVIDERS = "groq:llama-3.3-70b-versatile"
+DEFAULT_TEMPERATURE = 0.7
+# Hedge delay used until a provider has enough samples for a meaningful p95
+DEFAULT_HEDGE_DELAY_SECONDS = 2.0
+MIN_HEDGE_SAMPLES = 20
+
+
+class LatencyHistogram:
+    """
+    Rolling window of call latencies, in seconds.
+
+    Only completed calls are recorded as is. An attempt cut short (cancelled
+    after losing a hedge, or timed out) only shows the call would have taken
+    longer than its elapsed time, so record_censored keeps it only when that
+    already exceeds the current p95; otherwise it says nothing about the tail.
+    """
+
+    def __init__(self, window: int = 200) -> None:
+        self._samples: Deque[float] = deque(maxlen=window)
+        self.failures = 0
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def record_censored(self, seconds: float) -> None:
+        p95 = self.quantile(0.95)
+        if p95 is not None and seconds > p95:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[idx]
+
+
+class ModelProvider:
+    """
+    A named chat model backend and its latency history.
+    """
+
+    def __init__(self, name: str, model: Any) -> None:
+        self.name = name
+        self.model = model
+        self.latency = LatencyHistogram()
+
+    def hedge_delay(self) -> float:
+        if len(self.latency) < MIN_HEDGE_SAMPLES:
+            return DEFAULT_HEDGE_DELAY_SECONDS
+        return self.latency.quantile(0.95) or DEFAULT_HEDGE_DELAY_SECONDS
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50 = self.latency.quantile(0.5)
+        p95 = self.latency.quantile(0.95)
+        return {
+            "samples": len(self.latency),
+            "failures": self.latency.failures,
+            "p50": round(p50, 3) if p50 is not None else None,
+            "p95": round(p95, 3) if p95 is not None else None,
+        }
+
+
+def build_provider(spec: str) -> ModelProvider:
+    """
+    Create a provider from a `kind:model[@base_url]` spec.
+    """
+    body, _, base_url = spec.strip().partition("@")
+    kind, _, model_name = body.partition(":")
+    if not model_name:
+        raise ValueError(f"invalid model provider spec {spec!r}; expected kind:model[@base_url]")
+    if kind == "groq":
+        from langchain_groq import ChatGroq
+        model = ChatGroq(model=model_name, temperature=DEFAULT_TEMPERATURE)
+    elif kind == "openai":
+        from langchain_openai import ChatOpenAI
+        kwargs: Dict[str, Any] = {"model": model_name, "temperature": DEFAULT_TEMPERATURE}
+        if base_url:
+            # Local stand-in servers usually accept any key
+            kwargs["base_url"] = base_url
+            kwargs["api_key"] = os.getenv("OPENAI_API_KEY") or "not-needed"
+        model = ChatOpenAI(**kwargs)
+    else:
+        raise ValueError(f"unknown model provider kind {kind!r} in {spec!r}")
+    return ModelProvider(spec.strip(), model)
+
+
+def _env_seconds(name: str) -> Optional[float]:
+    raw = (os.getenv(name) or "").strip()
+    if not raw:
+        return None
+    try:
+        value = float(raw)
+    except ValueError:
+        print(f"ignoring {name}={raw!r}: not a number")
+        return None
+    return value if value > 0 else None
+
+
+def detached_config(config: Any) -> Dict[str, Any]:
+    """
+    Copy of a run config without its callbacks or run id, for model calls
+    that must not report into the run directly (concurrent or background ones).
+    Tags, metadata and run name are kept.
+    """
+    return {k: v for k, v in dict(config or {}).items() if k not in ("callbacks", "run_id")}
+
+
+async def replay_response(response: BaseMessage, config: Any, run_name: str) -> BaseMessage:
+    """
+    Emit an already computed response through the run's config, exactly once,
+    so callbacks (tracing, LangGraph/CopilotKit message events) see it as the
+    model call of this step.
+    """
+    if not config:
+        return response
+    replay = FakeMessagesListChatModel(responses=[response])
+    return await replay.ainvoke([], {**dict(config), "run_name": run_name})
+
+
+def _retrieve_exception(task: asyncio.Task) -> None:
+    # Losing attempts are never awaited; read their exception so asyncio does not warn
+    if not task.cancelled():
+        task.exception()
+
+
+class ModelRouter:
+    """
+    Chat model facade over one or more providers. Mirrors the `bind_tools(...)`
+    / `ainvoke(...)` surface chat_node uses on a single chat model.
+    """
+
+    def __init__(self, providers: List[ModelProvider], hedge: bool = False, timeout: Optional[float] = None) -> None:
+        if not providers:
+            raise ValueError("at least one model provider is required")
+        self.providers = providers
+        self.hedge = hedge
+        self.timeout = timeout
+        self.calls = 0
+        self.fallbacks = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        specs = [s for s in (os.getenv("AGENT_MODEL_PROVIDERS") or DEFAULT_PROVIDERS).split(",") if s.strip()]
+        timeout = _env_seconds("AGENT_MODEL_TIMEOUT")
+        hedge = os.getenv("AGENT_MODEL_HEDGE", "").lower() in ("1", "true", "yes")
+        return cls([build_provider(s) for s in specs], hedge=hedge, timeout=timeout)
+
+    def bind_tools(self, tools: List[Any], **kwargs: Any) -> "BoundModelRouter":
+        return BoundModelRouter(self, [(p, p.model.bind_tools(tools, **kwargs)) for p in self.providers])
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "fallbacks": self.fallbacks,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "providers": {p.name: p.snapshot() for p in self.providers},
+        }
+
+
+class BoundModelRouter:
+    """
+    The per-call result of ModelRouter.bind_tools.
+    """
+
+    def __init__(self, router: ModelRouter, bound: List[Tuple[ModelProvider, Any]]) -> None:
+        self.router = router
+        self.bound = bound
+
+    async def _attempt(self, provider: ModelProvider, runnable: Any, messages: List[BaseMessage], config: Any) -> BaseMessage:
+        started = time.perf_counter()
+        try:
+            call = runnable.ainvoke(messages, config)
+            response = await (asyncio.wait_for(call, self.router.timeout) if self.router.timeout else call)
+        except asyncio.TimeoutError:
+            provider.latency.failures += 1
+            provider.latency.record_censored(time.perf_counter() - started)
+            raise
+        except asyncio.CancelledError:
+            provider.latency.record_censored(time.perf_counter() - started)
+            raise
+        except Exception:
+            provider.latency.failures += 1
+            raise
+        provider.latency.record(time.perf_counter() - started)
+        return response
+
+    async def ainvoke(self, messages: List[BaseMessage], config: Any = None) -> BaseMessage:
+        self.router.calls += 1
+        if self.router.hedge and len(self.bound) > 1:
+            return await self._hedged(messages, config)
+        return await self._with_fallbacks(messages, config)
+
+    def _detached_attempt(self, provider: ModelProvider, runnable: Any, messages: List[BaseMessage], config: Any) -> asyncio.Task:
+        # Empty context: the attempt must not inherit the run's callbacks through context vars either
+        task = asyncio.get_running_loop().create_task(
+            self._attempt(provider, runnable, messages, detached_config(config)), context=contextvars.Context()
+        )
+        task.add_done_callback(_retrieve_exception)
+        return task
+
+    async def _with_fallbacks(self, messages: List[BaseMessage], config: Any) -> BaseMessage:
+        if len(self.bound) == 1:
+            # Nothing to fall back to, so the call can stream straight into the run
+            provider, runnable = self.bound[0]
+            return await self._attempt(provider, runnable, messages, config)
+        last_error: Optional[BaseException] = None
+        for i, (provider, runnable) in enumerate(self.bound):
+            if i > 0:
+                self.router.fallbacks += 1
+            try:
+                response = await self._detached_attempt(provider, runnable, messages, config)
+            except Exception as e:
+                print(f"model provider {provider.name} failed: {e!r}")
+                last_error = e
+                continue
+            return await replay_response(response, config, provider.name)
+        assert last_error is not None
+        raise last_error
+
+    async def _hedged(self, messages: List[BaseMessage], config: Any) -> BaseMessage:
+        queue = list(self.bound)
+        running: Dict[asyncio.Task, ModelProvider] = {}
+        hedged: Set[asyncio.Task] = set()
+        last_error: Optional[BaseException] = None
+
+        def launch() -> asyncio.Task:
+            provider, runnable = queue.pop(0)
+            task = self._detached_attempt(provider, runnable, messages, config)
+            running[task] = provider
+            return task
+
+        launch()
+        try:
+            while running:
+                delay = min(p.hedge_delay() for p in running.values()) if queue else None
+                done, _ = await asyncio.wait(running, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.router.hedges += 1
+                    task = launch()
+                    hedged.add(task)
+                    print(f"hedging model call to {running[task].name} after {delay:.2f}s")
+                    continue
+                for task in done:
+                    provider = running.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if task in hedged:
+                            self.router.hedge_wins += 1
+                        return await replay_response(task.result(), config, provider.name)
+                    print(f"model provider {provider.name} failed: {error!r}")
+                    last_error = error
+                    if queue:
+                        self.router.fallbacks += 1
+                        launch()
+            assert last_error is not None
+            raise last_error
+        finally:
+            for task in running:
+                task.cancel()
+
+
+_router: Optional[ModelRouter] = None
+
+
+def get_router() -> ModelRouter:
+    """
+    Process-wide router, so latency histograms accumulate across runs.
+    """
+    global _router
+    if _router is None:
+        _router = ModelRouter.from_env()
+    return _router
@@ -0,0 +1,358 @@
+"""
+Speculative prefetch of the next plan step.
+
+When chat_node hands frontend tool calls to the client mid-plan, the next LLM
+call normally waits for the client to apply them and start a new run. With
+AGENT_SPECULATIVE_PREFETCH=1 the agent instead starts that call right away,
+against the state chat_node predicts (plan progress applied, tool results
+pending). When the next run arrives its real prompt is fingerprinted: if it
+matches the speculative one the prefetched response is committed, otherwise it
+is discarded and the model is called as usual.
+
+Frontend tool result contents are not known ahead of time, so they are left
+out of the fingerprint; everything else the model sees (ground truth, plan,
+history, tool call ids) must match exactly. To make that possible the canvas
+effects of the pending frontend tool calls are predicted by mirroring the
+client reducers in src/app/canvas/page.tsx and src/lib/canvas/updates.ts, and
+only keys declared on AgentState are carried over, since LangGraph drops the
+rest before the next run sees them.
+Calls whose outcome depends on client-only state (e.g. creation throttles or
+unlabelled checklist/metric additions) are not predicted, and no speculation
+is started for that hop.
+"""
+
+import asyncio
+import contextvars
+import copy
+import hashlib
+import json
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, ToolMessage
+
+from canvas_io import default_data_for
+from providers import detached_config, replay_response
+
+SPECULATIVE_PREFETCH = os.getenv("AGENT_SPECULATIVE_PREFETCH", "").lower() in ("1", "true", "yes")
+# Speculations older than this are treated as stale and never committed
+SPECULATION_TTL_SECONDS = float(os.getenv("AGENT_SPECULATION_TTL") or 120)
+
+
+@dataclass
+class _Speculation:
+    fingerprint: str
+    task: "asyncio.Task[Tuple[BaseMessage, float]]"
+    started: float
+
+
+class SpeculationStats:
+    """
+    Process-wide counters for speculative calls.
+    """
+
+    def __init__(self) -> None:
+        self.started = 0
+        self.skipped = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.saved_seconds = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        resolved = self.hits + self.misses + self.errors
+        return self.hits / resolved if resolved else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "started": self.started,
+            "skipped": self.skipped,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round(self.hit_rate, 3),
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+
+stats = SpeculationStats()
+_pending: Dict[str, _Speculation] = {}
+
+
+def prompt_fingerprint(messages: List[BaseMessage]) -> str:
+    """
+    Hash a prompt, ignoring the contents of tool results.
+    """
+    parts: List[Any] = []
+    for m in messages:
+        if isinstance(m, ToolMessage):
+            parts.append(["tool", m.tool_call_id])
+            continue
+        calls = [
+            [tc.get("id"), tc.get("name"), tc.get("args")]
+            for tc in (getattr(m, "tool_calls", []) or [])
+        ]
+        parts.append([m.type, m.content, calls])
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class _Unpredictable(Exception):
+    pass
+
+
+def _tool_call_parts(tc: Any) -> Tuple[Optional[str], Dict[str, Any]]:
+    name = tc.get("name") if isinstance(tc, dict) else getattr(tc, "name", None)
+    args = tc.get("args") if isinstance(tc, dict) else getattr(tc, "args", {})
+    if not isinstance(args, dict):
+        try:
+            args = json.loads(args)
+        except Exception:
+            args = {}
+    return name, args if isinstance(args, dict) else {}
+
+
+def _clamp_metric(value: Any) -> Any:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return max(0, min(100, value))
+    return value
+
+
+def _apply_frontend_call(values: Dict[str, Any], name: str, args: Dict[str, Any]) -> None:
+    """
+    Apply one frontend tool call to `values` in place, mirroring the client
+    reducer for it. Raises _Unpredictable when the outcome cannot be known here.
+    """
+    items: List[Dict[str, Any]] = values["items"]
+    item_id = str(args.get("itemId", ""))
+    item = next((it for it in items if str(it.get("id", "")) == item_id), None)
+    data: Dict[str, Any] = (item.get("data") or {}) if item is not None else {}
+
+    def set_data(key: str, value: Any, require_str: bool = True) -> None:
+        # updateItemData leaves the item untouched if the field is absent / not a string
+        if item is not None and (not require_str or isinstance(data.get(key), str)):
+            item["data"] = {**data, key: value}
+
+    if name == "setGlobalTitle":
+        values["globalTitle"] = args.get("title", "")
+    elif name == "setGlobalDescription":
+        values["globalDescription"] = args.get("description", "")
+    elif name in ("setItemName", "setItemSubtitleOrDescription"):
+        key = "name" if name == "setItemName" else "subtitle"
+        if item is not None:
+            item[key] = args.get(key, "")
+    elif name == "setNoteField1":
+        if "field1" in data:
+            set_data("field1", args.get("value", ""), require_str=False)
+    elif name == "appendNoteField1":
+        if "field1" in data:
+            suffix = ("\n" if args.get("withNewline") else "") + str(args.get("value", ""))
+            set_data("field1", (data.get("field1") or "") + suffix, require_str=False)
+    elif name == "clearNoteField1":
+        if "field1" in data:
+            set_data("field1", "", require_str=False)
+    elif name in ("setProjectField1", "setEntityField1"):
+        set_data("field1", str(args.get("value", "")))
+    elif name in ("setProjectField2", "setEntityField2"):
+        set_data("field2", str(args.get("value", "")))
+    elif name == "setProjectField3":
+        date = args.get("date", args.get("value", args.get("val", args.get("text"))))
+        # The client also parses free-form dates with JS Date; only predict the canonical form
+        if not (isinstance(date, str) and re.match(r"^\d{4}-\d{2}-\d{2}$", date)):
+            raise _Unpredictable(name)
+        set_data("field3", date)
+    elif name == "clearProjectField3":
+        set_data("field3", "")
+    elif name == "addProjectChecklistItem":
+        text = str(args.get("text") or "")
+        if not text.strip():
+            raise _Unpredictable(name)
+        checklist = list(data.get("field4") or [])
+        if item is not None and item.get("type") == "project" and any((c.get("text") or "").strip() == text.strip() for c in checklist):
+            return
+        if item is not None:
+            next_count = (data.get("field4_id") or 0) + 1
+            checklist.append({"id": str(next_count).zfill(3), "text": text, "done": False, "proposed": False})
+            item["data"] = {**data, "field4": checklist, "field4_id": next_count}
+    elif name == "setProjectChecklistItem":
+        if item is None:
+            return
+        checklist = list(data.get("field4") or [])
+        target = str(args.get("checklistItemId", args.get("itemId", "")))
+        if not any(c.get("id") == target for c in checklist) and target.isdigit():
+            n = int(target)
+            idx = n if n < len(checklist) else (n - 1 if 0 < n <= len(checklist) else -1)
+            if idx >= 0:
+                target = checklist[idx].get("id")
+        done = args.get("done")
+        if isinstance(done, str) and done.strip().lower() in ("true", "false"):
+            done = done.strip().lower() == "true"
+        patch: Dict[str, Any] = {}
+        if args.get("text") is not None:
+            patch["text"] = str(args.get("text"))
+        if isinstance(done, bool):
+            patch["done"] = done
+        item["data"] = {**data, "field4": [{**c, **patch} if c.get("id") == target else c for c in checklist]}
+    elif name == "removeProjectChecklistItem":
+        if item is not None:
+            target = str(args.get("checklistItemId", ""))
+            item["data"] = {**data, "field4": [c for c in (data.get("field4") or []) if c.get("id") != target]}
+    elif name == "addEntityField3":
+        if item is not None:
+            tags = list(data.get("field3") or [])
+            if args.get("tag") not in tags:
+                tags.append(args.get("tag"))
+            item["data"] = {**data, "field3": tags}
+    elif name == "removeEntityField3":
+        if item is not None:
+            item["data"] = {**data, "field3": [t for t in (data.get("field3") or []) if t != args.get("tag")]}
+    elif name == "addChartField1":
+        label = str(args.get("label") or "")
+        if not label.strip():
+            raise _Unpredictable(name)
+        metrics = list(data.get("field1") or [])
+        if item is not None and item.get("type") == "chart" and any((m.get("label") or "").strip() == label.strip() for m in metrics):
+            return
+        if item is not None:
+            value = args.get("value")
+            value = _clamp_metric(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else ("" if value == "" else 0)
+            next_count = (data.get("field1_id") or 0) + 1
+            metrics.append({"id": str(next_count).zfill(3), "label": label, "value": value})
+            item["data"] = {**data, "field1": metrics, "field1_id": next_count}
+    elif name in ("setChartField1Label", "setChartField1Value", "clearChartField1Value", "removeChartField1"):
+        if item is None:
+            return
+        metrics = list(data.get("field1") or [])
+        try:
+            index = int(args.get("index"))
+        except (TypeError, ValueError):
+            raise _Unpredictable(name)
+        if not 0 <= index < len(metrics):
+            return
+        if name == "removeChartField1":
+            metrics.pop(index)
+        elif name == "setChartField1Label":
+            metrics[index] = {**metrics[index], "label": args.get("label", "")}
+        else:
+            value = "" if name == "clearChartField1Value" else args.get("value")
+            metrics[index] = {**metrics[index], "value": "" if value == "" else _clamp_metric(value)}
+        item["data"] = {**data, "field1": metrics}
+    elif name == "createItem":
+        itype = str(args.get("type", ""))
+        normalized = str(args.get("name") or "").strip()
+        plan_active = str(values.get("planStatus", "")) == "in_progress"
+        if plan_active and any(it.get("type") == itype for it in items):
+            return
+        if normalized and any(it.get("type") == itype and (it.get("name") or "").strip() == normalized for it in items):
+            return
+        # addItem numbers from max(itemsCreated, largest numeric id) + 1; itemsCreated only
+        # lives on the client, so a gap left by deleting the newest item makes this a miss
+        numeric_ids = [int(str(it.get("id", ""))) for it in items if str(it.get("id", "")).isdigit()]
+        created_id = str(max([0, *numeric_ids]) + 1).zfill(4)
+        items.append({"id": created_id, "type": itype, "name": normalized, "subtitle": "", "data": default_data_for(itype)})
+    elif name == "deleteItem":
+        values["items"] = [it for it in items if str(it.get("id", "")) != item_id]
+    else:
+        raise _Unpredictable(name or "")
+
+
+def predict_frontend_effects(state: Dict[str, Any], response: BaseMessage) -> Optional[Dict[str, Any]]:
+    """
+    Predict the canvas keys (items, globalTitle, globalDescription) after the
+    client applies the tool calls in `response`, or None if any of them cannot
+    be predicted.
+    """
+    values: Dict[str, Any] = {
+        "items": copy.deepcopy(state.get("items", []) or []),
+        "globalTitle": state.get("globalTitle", ""),
+        "globalDescription": state.get("globalDescription", ""),
+        "planStatus": state.get("planStatus", ""),
+    }
+    try:
+        for tc in getattr(response, "tool_calls", []) or []:
+            name, args = _tool_call_parts(tc)
+            _apply_frontend_call(values, str(name or ""), args)
+    except _Unpredictable as e:
+        stats.skipped += 1
+        print(f"speculation skipped: cannot predict {e}")
+        return None
+    values.pop("planStatus")
+    return values
+
+
+def placeholder_tool_results(response: BaseMessage) -> List[ToolMessage]:
+    """
+    Stand-in ToolMessages for the frontend calls in `response`, so the speculative
+    prompt is well-formed before the client has replied.
+    """
+    return [
+        ToolMessage(content="pending", tool_call_id=tc.get("id", ""), name=tc.get("name", ""))
+        for tc in (getattr(response, "tool_calls", []) or [])
+    ]
+
+
+async def _timed_invoke(model: Any, messages: List[BaseMessage], config: Dict[str, Any]) -> Tuple[BaseMessage, float]:
+    response = await model.ainvoke(messages, config)
+    return response, time.perf_counter()
+
+
+def _swallow_result(task: asyncio.Task) -> None:
+    # Retrieve the exception of discarded tasks so asyncio does not warn about it
+    if not task.cancelled():
+        task.exception()
+
+
+def discard(thread_id: str) -> None:
+    spec = _pending.pop(thread_id, None)
+    if spec is not None:
+        spec.task.cancel()
+
+
+def start(thread_id: str, model: Any, messages: List[BaseMessage], config: Any = None) -> None:
+    """
+    Begin the speculative model call for `thread_id` in the background. It
+    keeps the tags and metadata of `config` but none of its callbacks, as the
+    run they belong to is ending.
+    """
+    discard(thread_id)
+    now = time.perf_counter()
+    for tid in [t for t, s in _pending.items() if now - s.started > SPECULATION_TTL_SECONDS]:
+        discard(tid)
+    # Run in an empty context so the call is not attached to the callbacks of the run that is ending
+    task = asyncio.get_running_loop().create_task(
+        _timed_invoke(model, messages, detached_config(config)), context=contextvars.Context()
+    )
+    task.add_done_callback(_swallow_result)
+    _pending[thread_id] = _Speculation(prompt_fingerprint(messages), task, now)
+    stats.started += 1
+
+
+async def take(thread_id: str, messages: List[BaseMessage], config: Any = None) -> Optional[BaseMessage]:
+    """
+    Return the speculative response for `thread_id` if it was computed for an
+    identical prompt, else discard it and return None. A committed response is
+    replayed through `config`, the current run's, so its callbacks see it once.
+    """
+    spec = _pending.pop(thread_id, None)
+    if spec is None:
+        return None
+    now = time.perf_counter()
+    if now - spec.started > SPECULATION_TTL_SECONDS or spec.fingerprint != prompt_fingerprint(messages):
+        spec.task.cancel()
+        stats.misses += 1
+        print(f"speculation miss: {stats.snapshot()}")
+        return None
+    try:
+        response, finished = await spec.task
+    except Exception as e:
+        stats.errors += 1
+        print(f"speculation error: {e!r}; {stats.snapshot()}")
+        return None
+    # Only the part of the call that overlapped with the client applying tools was saved
+    stats.hits += 1
+    stats.saved_seconds += max(0.0, min(finished, now) - spec.started)
+    print(f"speculation hit: {stats.snapshot()}")
+    return await replay_response(response, config, "speculative")
@@ -0,0 +1,93 @@
+"""
+Minimal OpenAI-compatible chat completions server for exercising model
+provider fallbacks and hedging locally, without a real LLM.
+
+Usage:
+    python stub_model_server.py --port 9001 --delay 0.3 --jitter 2.0 --fail-rate 0.1
+    python stub_model_server.py --port 9002 --tool-call createItem --tool-args '{"type": "note"}'
+    AGENT_MODEL_PROVIDERS=openai:stub@http://localhost:9001/v1,openai:stub@http://localhost:9002/v1
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+
+def create_app(delay: float, jitter: float, fail_rate: float, reply: str, tool_call: Optional[str] = None, tool_args: str = "{}") -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        # Exponential jitter gives the long tail that hedging is meant to cut
+        await asyncio.sleep(delay + (random.expovariate(1 / jitter) if jitter > 0 else 0))
+        if random.random() < fail_rate:
+            raise HTTPException(status_code=503, detail="stub failure")
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", "stub")
+        # With --tool-call, answer with a single tool call; its id is unique per response,
+        # so a duplicated commit under hedging shows up as two different call ids
+        tool_calls = None
+        if tool_call:
+            tool_calls = [{
+                "id": f"call_{uuid.uuid4().hex[:24]}", "type": "function",
+                "function": {"name": tool_call, "arguments": tool_args},
+            }]
+        finish_reason = "tool_calls" if tool_calls else "stop"
+        if body.get("stream"):
+            async def events():
+                if tool_calls:
+                    delta = {"role": "assistant", "content": None, "tool_calls": [{"index": 0, **tool_calls[0]}]}
+                else:
+                    delta = {"role": "assistant", "content": reply}
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                chunk["choices"] = [{"index": 0, "delta": {}, "finish_reason": finish_reason}]
+                yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        return {
+            "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": None, "tool_calls": tool_calls} if tool_calls else {"role": "assistant", "content": reply},
+                "finish_reason": finish_reason,
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stand-in OpenAI-compatible model server.")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--delay", type=float, default=0.2, help="base latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="mean of extra exponential latency in seconds")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--reply", default=None)
+    parser.add_argument("--tool-call", default=None, metavar="NAME", help="respond with a call to this tool instead of text")
+    parser.add_argument("--tool-args", default="{}", help="JSON arguments for --tool-call")
+    args = parser.parse_args()
+    json.loads(args.tool_args)  # fail fast on invalid JSON
+    reply = args.reply or f"stub reply from port {args.port}"
+    app = create_app(args.delay, args.jitter, args.fail_rate, reply, args.tool_call, args.tool_args)
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+A speculative prompt must fingerprint the same as the real prompt of the run
+it stands in for, or speculation never hits.
+
+Run from agent/: python -m pytest test_speculation.py
+"""
+
+import asyncio
+import copy
+
+import pytest
+
+pytest.importorskip("langgraph")
+pytest.importorskip("copilotkit")
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+import agent
+import speculation
+
+THREAD_ID = "spec-test"
+
+
+class FakeModel:
+    """
+    Stands in for the provider router: returns the scripted responses in order,
+    repeating the last one, and records the prompts it was called with.
+    """
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.prompts = []
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    async def ainvoke(self, messages, config=None):
+        self.prompts.append(messages)
+        return self.responses[min(len(self.prompts), len(self.responses)) - 1]
+
+
+def _next_run_input(values):
+    # LangGraph only keeps the keys declared on AgentState between runs
+    return {k: v for k, v in values.items() if k in agent.AgentState.__annotations__}
+
+
+def _plan_state():
+    return {
+        "messages": [HumanMessage(content="Plan it: draft the intro note, then the outline note.")],
+        "items": [
+            {"id": "0001", "type": "note", "name": "Intro", "subtitle": "", "data": {"field1": ""}},
+            {"id": "0002", "type": "note", "name": "Outline", "subtitle": "", "data": {"field1": ""}},
+        ],
+        "globalTitle": "Essay",
+        "globalDescription": "",
+        "planSteps": [
+            {"title": "Draft the intro note", "status": "in_progress"},
+            {"title": "Draft the outline note", "status": "pending"},
+        ],
+        "currentStepIndex": 0,
+        "planStatus": "in_progress",
+    }
+
+
+def test_speculative_prompt_matches_next_run(monkeypatch):
+    tool_call = AIMessage(
+        content="",
+        tool_calls=[{"name": "setNoteField1", "args": {"itemId": "0001", "value": "Once upon a time"}, "id": "call_1"}],
+    )
+    follow_up = AIMessage(content="Intro drafted; moving on to the outline.")
+    model = FakeModel([tool_call, follow_up])
+    monkeypatch.setattr(agent.providers, "get_router", lambda: model)
+    monkeypatch.setattr(speculation, "SPECULATIVE_PREFETCH", True)
+    monkeypatch.setattr(speculation, "stats", speculation.SpeculationStats())
+    config = {"configurable": {"thread_id": THREAD_ID}}
+
+    async def hop():
+        # Run 1 hands setNoteField1 to the client and speculates on the next step
+        state = _plan_state()
+        command = await agent.chat_node(state, config)
+        assert speculation.stats.started == 1
+
+        # The client applies the call and starts run 2 with its real tool result
+        next_state = _next_run_input({**state, **command.update})
+        next_state["items"] = copy.deepcopy(next_state["items"])
+        next_state["items"][0]["data"]["field1"] = "Once upon a time"
+        next_state["messages"] = [
+            *state["messages"],
+            tool_call,
+            ToolMessage(content="updated note 0001", tool_call_id="call_1", name="setNoteField1"),
+        ]
+        await agent.chat_node(next_state, config)
+
+    try:
+        asyncio.run(hop())
+    finally:
+        agent.canvas_digest.forget(THREAD_ID)
+
+    assert speculation.stats.hits == 1, speculation.stats.snapshot()
+    # The committed speculation replaced run 2's own model call
+    assert len(model.prompts) == 2